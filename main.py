@@ -10,49 +10,98 @@ import tkinter as tk
 from tkinter import messagebox, filedialog, simpledialog
 import json
 import math
+import re
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import count, repeat
+from operator import floordiv
 
 
 # ============================================================================
-# GLOBAL DATA STRUCTURE
+# ENGINE STATE
 # ============================================================================
-shapes = []  # List of shape dictionaries: {'type': 'line', 'points': [...], 'color': '#000'}
-current_mode = 'line'  # Current drawing mode
-current_color = '#000000'  # Current color
-temp_points = []  # Temporary points for multi-click shapes
-clip_window = None  # Clipping rectangle [x1, y1, x2, y2]
+
+class EngineState:
+    """Drawing document and interaction state owned by the application"""
+    
+    def __init__(self):
+        self.shapes = []  # List of shape dictionaries: {'type': 'line', 'points': [...], 'color': '#000'}
+        self.current_mode = 'line'  # Current drawing mode
+        self.current_color = '#000000'  # Current color
+        self.temp_points = []  # Temporary points for multi-click shapes
+        self.clip_window = None  # Clipping rectangle [x1, y1, x2, y2]
 
 
 # ============================================================================
 # ALGORITHM LIBRARY
 # ============================================================================
 
+# Hardcoded 8x8 dot matrix patterns for demonstration (A, B, C), bit-packed
+# one byte per row: top row in the most significant byte, leftmost pixel in
+# each byte's high bit
+GLYPHS = {
+    'A': 0x3C66_C3FF_C3C3_C300,
+    'B': 0xFEC3_C3FE_C3C3_FE00,
+    'C': 0x7EC3_C0C0_C0C3_7E00,
+}
+
+
 class Algorithms:
     """Static methods for all graphics algorithms"""
     
     @staticmethod
     def bresenham_line(x0, y0, x1, y1):
         """Bresenham's line algorithm - returns list of (x, y) pixel coordinates"""
-        points = []
         dx = abs(x1 - x0)
         dy = abs(y1 - y0)
         sx = 1 if x0 < x1 else -1
         sy = 1 if y0 < y1 else -1
-        err = dx - dy
         
-        x, y = x0, y0
-        while True:
-            points.append((x, y))
-            if x == x1 and y == y1:
-                break
-            e2 = 2 * err
-            if e2 > -dy:
-                err -= dy
-                x += sx
-            if e2 < dx:
-                err += dx
-                y += sy
+        if dx == 0 and dy == 0:
+            return [(x0, y0)]
         
-        return points
+        # Closed form of the error accumulation: after i steps along the major
+        # axis the minor axis has moved floor((2*i*d_minor + d_major - 1) / (2*d_major)).
+        # Folding the start coordinate and direction into the numerator gives
+        # exactly the classic loop's pixels from C-level iterators, instead of
+        # one interpreted loop iteration per pixel.
+        if dx >= dy:
+            major = range(x0, x1 + sx, sx)
+            minor_start, minor_dir, d_major, d_minor = y0, sy, dx, dy
+        else:
+            major = range(y0, y1 + sy, sy)
+            minor_start, minor_dir, d_major, d_minor = x0, sx, dy, dx
+        
+        denom = 2 * d_major
+        if minor_dir > 0:
+            numerators = count(minor_start * denom + d_major - 1, 2 * d_minor)
+        else:
+            numerators = count(minor_start * denom + d_major, -2 * d_minor)
+        minor = map(floordiv, numerators, repeat(denom))
+        
+        if dx >= dy:
+            return list(zip(major, minor))
+        return list(zip(minor, major))
+    
+    @staticmethod
+    def polyline(vertices, closed=False):
+        """Connected Bresenham segments through vertices - returns list of (x, y) pixel coordinates"""
+        ends = [(int(x), int(y)) for x, y in vertices]
+        if not ends:
+            return []
+        if closed:
+            ends.append(ends[0])
+        
+        # Every segment starts on the previous segment's last pixel, so only
+        # the first vertex is emitted on its own and joins appear once
+        line = Algorithms.bresenham_line
+        pixels = [ends[0]]
+        extend = pixels.extend
+        for (x0, y0), (x1, y1) in zip(ends, ends[1:]):
+            segment = line(x0, y0, x1, y1)
+            del segment[0]
+            extend(segment)
+        return pixels
     
     @staticmethod
     def midpoint_circle(cx, cy, radius):
@@ -62,18 +111,16 @@ class Algorithms:
         y = radius
         d = 1 - radius
         
-        # Helper to add 8-way symmetric points
-        def add_symmetric(xc, yc, x, y):
-            pts = [
-                (xc + x, yc + y), (xc - x, yc + y),
-                (xc + x, yc - y), (xc - x, yc - y),
-                (xc + y, yc + x), (xc - y, yc + x),
-                (xc + y, yc - x), (xc - y, yc - x)
-            ]
-            return pts
+        extend = points.extend
         
         while x <= y:
-            points.extend(add_symmetric(cx, cy, x, y))
+            # Add 8-way symmetric points
+            extend((
+                (cx + x, cy + y), (cx - x, cy + y),
+                (cx + x, cy - y), (cx - x, cy - y),
+                (cx + y, cy + x), (cx - y, cy + x),
+                (cx + y, cy - x), (cx - y, cy - x)
+            ))
             if d < 0:
                 d += 2 * x + 3
             else:
@@ -83,73 +130,109 @@ class Algorithms:
         
         return points
     
+    @staticmethod
+    def bezier_coefficients(p0, p1, p2, p3):
+        """Power form (a, b, c, d) of a cubic Bezier: P(t) = a*t^3 + b*t^2 + c*t + d"""
+        # x and y are packed into one complex number so both axes share the
+        # same expressions
+        z0 = complex(p0[0], p0[1])
+        z1 = complex(p1[0], p1[1])
+        z2 = complex(p2[0], p2[1])
+        z3 = complex(p3[0], p3[1])
+        a = -z0 + 3 * z1 - 3 * z2 + z3
+        b = 3 * z0 - 6 * z1 + 3 * z2
+        c = -3 * z0 + 3 * z1
+        return a, b, c, z0
+    
+    @staticmethod
+    def bezier_forward_differences(p0, p1, p2, p3, steps):
+        """Start point and first three forward differences (p, d1, d2, d3) of a cubic Bezier"""
+        a, b, c, p = Algorithms.bezier_coefficients(p0, p1, p2, p3)
+        h = 1 / steps
+        h2 = h * h
+        h3 = h2 * h
+        d1 = a * h3 + b * h2 + c * h
+        d3 = 6 * a * h3
+        d2 = d3 + 2 * b * h2
+        return p, d1, d2, d3
+    
     @staticmethod
     def bezier_curve(p0, p1, p2, p3, steps=100):
-        """Cubic Bezier curve with 4 control points - returns list of (x, y) coordinates"""
+        """Cubic Bezier curve with 4 control points - returns list of (x, y) coordinates
+        
+        Library algorithm returning the sampled points only; render_shape draws
+        curves with bezier_stroke, which shares bezier_forward_differences
+        """
+        # Forward differences for step 1/steps: each sample costs three adds
+        p, d1, d2, d3 = Algorithms.bezier_forward_differences(p0, p1, p2, p3, steps)
+        
         points = []
-        for i in range(steps + 1):
-            t = i / steps
-            t2 = t * t
-            t3 = t2 * t
-            mt = 1 - t
-            mt2 = mt * mt
-            mt3 = mt2 * mt
-            
-            x = mt3 * p0[0] + 3 * mt2 * t * p1[0] + 3 * mt * t2 * p2[0] + t3 * p3[0]
-            y = mt3 * p0[1] + 3 * mt2 * t * p1[1] + 3 * mt * t2 * p2[1] + t3 * p3[1]
-            points.append((int(x), int(y)))
+        append = points.append
+        for _ in range(steps):
+            # The differences drift by ~1e-12; the tolerance keeps samples that
+            # are exact integers from truncating to the pixel below
+            append((int(p.real + 1e-9), int(p.imag + 1e-9)))
+            p += d1
+            d1 += d2
+            d2 += d3
+        # End exactly on p3 rather than on the accumulated rounding error
+        append((int(p3[0]), int(p3[1])))
         
         return points
     
     @staticmethod
-    def dot_matrix_char(char, x, y, scale=1):
-        """8x8 dot matrix character - returns list of (x, y) pixel coordinates"""
-        # Hardcoded 8x8 patterns for demonstration (A, B, C)
-        patterns = {
-            'A': [
-                "  ████  ",
-                " ██  ██ ",
-                "██    ██",
-                "████████",
-                "██    ██",
-                "██    ██",
-                "██    ██",
-                "        "
-            ],
-            'B': [
-                "███████ ",
-                "██    ██",
-                "██    ██",
-                "███████ ",
-                "██    ██",
-                "██    ██",
-                "███████ ",
-                "        "
-            ],
-            'C': [
-                " ██████ ",
-                "██    ██",
-                "██      ",
-                "██      ",
-                "██      ",
-                "██    ██",
-                " ██████ ",
-                "        "
-            ]
-        }
+    def bezier_stroke(p0, p1, p2, p3, steps=100):
+        """Rasterize a cubic Bezier directly - returns list of connected (x, y) pixels"""
+        p, d1, d2, d3 = Algorithms.bezier_forward_differences(p0, p1, p2, p3, steps)
+        line = Algorithms.bresenham_line
         
-        pattern = patterns.get(char.upper(), patterns['A'])
-        points = []
+        # Same forward differencing as bezier_curve, but each sample is joined
+        # to the previous one as soon as it is computed: no intermediate sample
+        # list, and the shared pixel at every join is emitted only once
+        x0, y0 = int(p.real + 1e-9), int(p.imag + 1e-9)
+        pixels = [(x0, y0)]
+        extend = pixels.extend
+        for _ in range(steps - 1):
+            p += d1
+            d1 += d2
+            d2 += d3
+            x1, y1 = int(p.real + 1e-9), int(p.imag + 1e-9)
+            if x1 != x0 or y1 != y0:
+                segment = line(x0, y0, x1, y1)
+                del segment[0]
+                extend(segment)
+                x0, y0 = x1, y1
+        
+        # End exactly on p3 rather than on the accumulated rounding error
+        x1, y1 = int(p3[0]), int(p3[1])
+        if x1 != x0 or y1 != y0:
+            segment = line(x0, y0, x1, y1)
+            del segment[0]
+            extend(segment)
         
-        for row_idx, row in enumerate(pattern):
-            for col_idx, pixel in enumerate(row):
-                if pixel == '█':
+        return pixels
+    
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def glyph_offsets(char, scale):
+        """Pixel offsets of a scaled 8x8 glyph relative to its top-left corner"""
+        glyph = GLYPHS.get(char.upper(), GLYPHS['A'])
+        offsets = []
+        for row in range(8):
+            row_bits = (glyph >> (56 - 8 * row)) & 0xFF
+            for col in range(8):
+                if row_bits & (0x80 >> col):
                     # Add scaled pixels
                     for dy in range(scale):
                         for dx in range(scale):
-                            points.append((x + col_idx * scale + dx, y + row_idx * scale + dy))
-        
-        return points
+                            offsets.append((col * scale + dx, row * scale + dy))
+        return tuple(offsets)
+    
+    @staticmethod
+    def dot_matrix_char(char, x, y, scale=1):
+        """8x8 dot matrix character - returns list of (x, y) pixel coordinates"""
+        # Glyph bits are expanded once per (char, scale); drawing only offsets them
+        return [(x + dx, y + dy) for dx, dy in Algorithms.glyph_offsets(char, scale)]
     
     @staticmethod
     def scanline_fill(vertices, bbox):
@@ -158,37 +241,86 @@ class Algorithms:
             return []
         
         points = []
-        min_y = max(int(min(v[1] for v in vertices)), bbox[1])
-        max_y = min(int(max(v[1] for v in vertices)), bbox[3])
+        extend = points.extend
+        y_lo = bbox[1]
+        y_hi = bbox[3]
         
-        for y in range(min_y, max_y + 1):
-            intersections = []
-            n = len(vertices)
+        # Edge table: each non-horizontal edge is bucketed by the first scanline
+        # it crosses, as [x at that scanline, scanline it ends before, 1/slope].
+        # Edges cover [y_min, y_max) so shared vertices are counted only once.
+        edge_table = {}
+        end_rows = set()
+        xa, ya = vertices[-1]
+        for xb, yb in vertices:
+            if ya != yb:
+                if ya < yb:
+                    x_top, y_top, y_bottom = xa, ya, yb
+                else:
+                    x_top, y_top, y_bottom = xb, yb, ya
+                y_start = max(math.ceil(y_top), y_lo)
+                y_end = min(math.ceil(y_bottom), y_hi + 1)
+                if y_start < y_end:
+                    inv_slope = (xb - xa) / (yb - ya)
+                    x = x_top + (y_start - y_top) * inv_slope
+                    edge_table.setdefault(y_start, []).append([x, y_end, inv_slope])
+                    end_rows.add(y_end)
+            xa, ya = xb, yb
+        
+        if not edge_table:
+            return []
+        
+        # The active edge set only changes on rows where an edge starts or
+        # ends, so activation and retirement are handled once per band of
+        # scanlines between such rows instead of being tested on every row
+        x_lo = bbox[0]
+        x_hi = bbox[2]
+        event_rows = sorted(end_rows.union(edge_table))
+        active = []
+        for band_start, band_end in zip(event_rows, event_rows[1:]):
+            if band_start in end_rows:
+                active = [edge for edge in active if edge[1] != band_start]
+            active.extend(edge_table.get(band_start, ()))
             
-            for i in range(n):
-                v1 = vertices[i]
-                v2 = vertices[(i + 1) % n]
+            # Walk the band keeping the Active Edge Table sorted by x; edges
+            # advance incrementally by 1/slope instead of being re-intersected
+            for y in range(band_start, band_end):
+                active.sort()
                 
-                if v1[1] == v2[1]:  # Horizontal edge
-                    continue
-                
-                if y < min(v1[1], v2[1]) or y > max(v1[1], v2[1]):
-                    continue
+                # Fill between pairs of intersections, one C-level extend per span
+                for i in range(0, len(active) - 1, 2):
+                    x1 = max(int(active[i][0]), x_lo)
+                    x2 = min(int(active[i + 1][0]), x_hi)
+                    extend(zip(range(x1, x2 + 1), repeat(y)))
                 
-                x = v1[0] + (y - v1[1]) * (v2[0] - v1[0]) / (v2[1] - v1[1])
-                intersections.append(int(x))
-            
-            intersections.sort()
-            
-            # Fill between pairs of intersections
-            for i in range(0, len(intersections) - 1, 2):
-                x1 = max(intersections[i], bbox[0])
-                x2 = min(intersections[i + 1], bbox[2])
-                for x in range(x1, x2 + 1):
-                    points.append((x, y))
+                for edge in active:
+                    edge[0] += edge[2]
         
         return points
     
+    @staticmethod
+    def cohen_sutherland_clip_batch(lines, clip_rect):
+        """Cohen-Sutherland clipping of many (x0, y0, x1, y1) lines - returns list of clipped lines or None"""
+        xmin, ymin, xmax, ymax = clip_rect
+        clip = Algorithms.cohen_sutherland_clip
+        results = []
+        append = results.append
+        
+        for line in lines:
+            x0, y0, x1, y1 = line
+            # Outcodes packed branch-free with the same bits as cohen_sutherland_clip
+            # (LEFT=1, RIGHT=2, BOTTOM=4, TOP=8)
+            code0 = (x0 < xmin) | (x0 > xmax) << 1 | (y0 > ymax) << 2 | (y0 < ymin) << 3
+            code1 = (x1 < xmin) | (x1 > xmax) << 1 | (y1 > ymax) << 2 | (y1 < ymin) << 3
+            if not code0 | code1:  # Trivially accepted
+                append((int(x0), int(y0), int(x1), int(y1)))
+            elif code0 & code1:  # Trivially rejected
+                append(None)
+            else:
+                # Only lines crossing the window boundary need the full algorithm
+                append(clip(x0, y0, x1, y1, clip_rect))
+        
+        return results
+    
     @staticmethod
     def cohen_sutherland_clip(x0, y0, x1, y1, clip_rect):
         """Cohen-Sutherland line clipping - returns clipped line or None"""
@@ -261,40 +393,114 @@ def translate_shape(shape, dx, dy):
     """Translate shape by offset"""
     if 'points' in shape:
         shape['points'] = [(x + dx, y + dy) for x, y in shape['points']]
+        shape.pop('_cached_runs', None)
 
 def rotate_shape(shape, angle_deg, cx=400, cy=300):
     """Rotate shape around center point"""
     angle = math.radians(angle_deg)
-    cos_a = math.cos(angle)
-    sin_a = math.sin(angle)
+    # As complex numbers, rotation about the center is (p - c) * e^(i*angle) + c
+    rotation = complex(math.cos(angle), math.sin(angle))
+    center = complex(cx, cy)
     
     if 'points' in shape:
-        new_points = []
-        for x, y in shape['points']:
-            # Translate to origin
-            x -= cx
-            y -= cy
-            # Rotate
-            new_x = x * cos_a - y * sin_a
-            new_y = x * sin_a + y * cos_a
-            # Translate back
-            new_points.append((new_x + cx, new_y + cy))
-        shape['points'] = new_points
+        rotated = [(complex(x, y) - center) * rotation + center for x, y in shape['points']]
+        shape['points'] = [(p.real, p.imag) for p in rotated]
+        shape.pop('_cached_runs', None)
 
 def scale_shape(shape, factor, cx=400, cy=300):
     """Scale shape around center point"""
+    center = complex(cx, cy)
+    
     if 'points' in shape:
-        new_points = []
-        for x, y in shape['points']:
-            # Translate to origin
-            x -= cx
-            y -= cy
-            # Scale
-            new_x = x * factor
-            new_y = y * factor
-            # Translate back
-            new_points.append((new_x + cx, new_y + cy))
-        shape['points'] = new_points
+        scaled = [(complex(x, y) - center) * factor + center for x, y in shape['points']]
+        shape['points'] = [(p.real, p.imag) for p in scaled]
+        shape.pop('_cached_runs', None)
+
+
+# ============================================================================
+# FILE I/O
+# ============================================================================
+
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+def write_shapes(f, shapes):
+    """Write shapes as a JSON array, one shape per line, streaming to the file"""
+    f.write('[')
+    for i, shape in enumerate(shapes):
+        f.write(',\n  ' if i else '\n  ')
+        # Runtime caches (underscore keys) are not part of the file format
+        data = {k: v for k, v in shape.items() if not k.startswith('_')}
+        f.write(json.dumps(data, ensure_ascii=False))
+    f.write('\n]\n')
+
+def read_shapes(f, chunk_size=1 << 16):
+    """Yield shapes from a JSON array file, decoding it chunk by chunk"""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    consumed = 0  # Characters dropped from the front of buf, for error offsets
+    eof = False
+    read_size = chunk_size
+    started = False  # Opening '[' consumed
+    need_comma = False  # A shape was read and ',' or ']' must follow
+    after_comma = False  # A ',' was read and another shape must follow
+    
+    while True:
+        pos = JSON_WHITESPACE.match(buf, pos).end()
+        if pos < len(buf):
+            ch = buf[pos]
+            if not started:
+                if ch != '[':
+                    raise ValueError("Expected a JSON array of shapes")
+                started = True
+                pos += 1
+                continue
+            if ch == ']':
+                if after_comma:
+                    raise ValueError(f"Unexpected ']' after ',' at offset {consumed + pos}")
+                break
+            if need_comma:
+                if ch != ',':
+                    raise ValueError(f"Expected ',' or ']' at offset {consumed + pos}")
+                need_comma = False
+                after_comma = True
+                pos += 1
+                continue
+            try:
+                shape, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                # The shape may just be cut off at the end of the buffer;
+                # read as much again as is pending so each retry doubles it
+                if eof:
+                    raise ValueError(f"{e.msg} at offset {consumed + e.pos}") from None
+                read_size = max(chunk_size, len(buf) - pos)
+            else:
+                yield shape
+                need_comma = True
+                after_comma = False
+                read_size = chunk_size
+                continue
+        elif eof:
+            raise ValueError("Unexpected end of file")
+        
+        # Drop the consumed text and read the next chunk
+        chunk = f.read(read_size)
+        eof = not chunk
+        consumed += pos
+        buf = buf[pos:] + chunk
+        pos = 0
+    
+    # Only whitespace may follow the closing ']'
+    pos += 1
+    while True:
+        pos = JSON_WHITESPACE.match(buf, pos).end()
+        if pos < len(buf):
+            raise ValueError(f"Unexpected data after ']' at offset {consumed + pos}")
+        consumed += pos
+        buf = f.read(chunk_size)
+        pos = 0
+        if not buf:
+            return
 
 
 # ============================================================================
@@ -313,28 +519,132 @@ class PixelCanvas:
         # Create PhotoImage
         self.image = tk.PhotoImage(width=width, height=height)
         self.canvas.create_image(0, 0, anchor=tk.NW, image=self.image)
-        self.clear()
+        
+        # Pixels are composed in an RGB framebuffer (3 bytes per pixel, row
+        # major) and uploaded to the PhotoImage in one call per flush
+        self.rgb_cache = {}
+        self.bg_row = self.rgb_bytes(bg_color) * width  # One full row, reused by clear()
+        self.framebuffer = bytearray(self.bg_row * height)
+        
+        # Bounding boxes (x0, y0, x1, y1), exclusive, or None when empty:
+        # drawn_bbox covers everything drawn since the last clear, dirty_bbox
+        # everything changed in the framebuffer since the last flush
+        self.drawn_bbox = None
+        self.dirty_bbox = (0, 0, width, height)
+        self.flush()
+    
+    @staticmethod
+    def merge_bbox(a, b):
+        """Union of two (x0, y0, x1, y1) boxes, either of which may be None"""
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+    
+    def rgb_bytes(self, color):
+        """3-byte RGB value of any Tk color name or #rrggbb string"""
+        rgb = self.rgb_cache.get(color)
+        if rgb is None:
+            # winfo_rgb reports 16-bit channels
+            rgb = self.rgb_cache[color] = bytes(c >> 8 for c in self.canvas.winfo_rgb(color))
+        return rgb
     
     def clear(self):
         """Clear canvas to background color"""
-        self.image.put(self.bg_color, to=(0, 0, self.width, self.height))
+        # Only the area drawn on since the last clear needs repainting
+        if self.drawn_bbox is None:
+            return
+        x0, y0, x1, y1 = self.drawn_bbox
+        stride = self.width * 3
+        row = self.bg_row[:(x1 - x0) * 3]
+        buf = self.framebuffer
+        for offset in range(y0 * stride + x0 * 3, y1 * stride, stride):
+            buf[offset:offset + len(row)] = row
+        
+        self.dirty_bbox = self.merge_bbox(self.dirty_bbox, self.drawn_bbox)
+        self.drawn_bbox = None
     
-    def put_pixels(self, pixels, color):
-        """Batch update pixels - optimized version"""
-        if not pixels:
+    def flush(self):
+        """Upload the changed part of the framebuffer to the PhotoImage"""
+        if self.dirty_bbox is None:
             return
+        x0, y0, x1, y1 = self.dirty_bbox
+        stride = self.width * 3
+        buf = self.framebuffer
         
-        # Filter out-of-bounds pixels
-        valid_pixels = [(x, y) for x, y in pixels 
-                       if 0 <= x < self.width and 0 <= y < self.height]
+        # One binary PPM holding the dirty rectangle, put with a single Tk call
+        rows = [buf[offset + x0 * 3:offset + x1 * 3]
+                for offset in range(y0 * stride, y1 * stride, stride)]
+        data = b"P6 %d %d 255\n" % (x1 - x0, y1 - y0) + b"".join(rows)
+        self.image.tk.call(self.image.name, 'put', data, '-format', 'ppm', '-to', x0, y0)
+        self.dirty_bbox = None
+    
+    def pixel_runs(self, pixels):
+        """Clip pixels to the canvas and merge them into (y, x_start, x_end) horizontal runs"""
+        # Group pixels by scanline; bounds are checked per row and per run
+        # below rather than per pixel
+        rows = {}
+        for x, y in pixels:
+            row = rows.get(y)
+            if row is None:
+                rows[y] = [x]
+            else:
+                row.append(x)
         
-        if not valid_pixels:
+        runs = []
+        append = runs.append
+        width = self.width
+        height = self.height
+        for y, xs in rows.items():
+            if not 0 <= y < height:
+                continue
+            xs.sort()
+            # Clip the sorted row to [0, width) with two binary searches
+            if xs[0] < 0 or xs[-1] >= width:
+                xs = xs[bisect_left(xs, 0):bisect_left(xs, width)]
+                if not xs:
+                    continue
+            # Maximal runs of adjacent pixels
+            x_start = x_prev = xs[0]
+            for x in xs:
+                if x > x_prev + 1:
+                    append((y, x_start, x_prev))
+                    x_start = x
+                x_prev = x
+            append((y, x_start, x_prev))
+        
+        return runs
+    
+    def put_runs(self, runs, color):
+        """Write clipped (y, x_start, x_end) runs into the framebuffer, one slice assignment each"""
+        if not runs:
             return
         
-        # Batch update by drawing individual pixels
-        # PhotoImage.put is efficient for this use case
-        for x, y in valid_pixels:
-            self.image.put(color, (x, y))
+        # Runs of this color as framebuffer bytes, keyed by run length
+        rgb = self.rgb_bytes(color)
+        run_data = {}
+        buf = self.framebuffer
+        stride = self.width * 3
+        for y, x_start, x_end in runs:
+            length = x_end - x_start + 1
+            data = run_data.get(length)
+            if data is None:
+                data = run_data[length] = rgb * length
+            offset = y * stride + x_start * 3
+            buf[offset:offset + 3 * length] = data
+        
+        ys = [run[0] for run in runs]
+        bbox = (min(run[1] for run in runs), min(ys),
+                max(run[2] for run in runs) + 1, max(ys) + 1)
+        self.drawn_bbox = self.merge_bbox(self.drawn_bbox, bbox)
+        self.dirty_bbox = self.merge_bbox(self.dirty_bbox, bbox)
+    
+    def put_pixels(self, pixels, color):
+        """Batch update pixels - written into the framebuffer one horizontal run at a time"""
+        if not pixels:
+            return
+        self.put_runs(self.pixel_runs(pixels), color)
     
     def render_shape(self, shape):
         """Render a single shape using appropriate algorithm"""
@@ -342,6 +652,14 @@ class PixelCanvas:
         points = shape.get('points', [])
         color = shape.get('color', '#000000')
         
+        # Reuse the clipped runs from an earlier redraw while the shape is
+        # unchanged; anything that edits a shape drops '_cached_runs'. Runs
+        # rather than pixels keep the cache small and skip regrouping
+        runs = shape.get('_cached_runs')
+        if runs is not None:
+            self.put_runs(runs, color)
+            return
+        
         pixels = []
         
         if shape_type == 'line' and len(points) >= 2:
@@ -357,13 +675,7 @@ class PixelCanvas:
         
         elif shape_type == 'bezier' and len(points) >= 4:
             p0, p1, p2, p3 = points[:4]
-            curve_points = Algorithms.bezier_curve(p0, p1, p2, p3)
-            # Draw curve with Bresenham between consecutive points
-            for i in range(len(curve_points) - 1):
-                pixels.extend(Algorithms.bresenham_line(
-                    curve_points[i][0], curve_points[i][1],
-                    curve_points[i + 1][0], curve_points[i + 1][1]
-                ))
+            pixels = Algorithms.bezier_stroke(p0, p1, p2, p3)
         
         elif shape_type == 'char' and len(points) >= 1:
             x, y = map(int, points[0])
@@ -373,12 +685,7 @@ class PixelCanvas:
         
         elif shape_type == 'polygon' and len(points) >= 3:
             # Draw outline
-            for i in range(len(points)):
-                p0 = points[i]
-                p1 = points[(i + 1) % len(points)]
-                pixels.extend(Algorithms.bresenham_line(
-                    int(p0[0]), int(p0[1]), int(p1[0]), int(p1[1])
-                ))
+            pixels = Algorithms.polyline(points, closed=True)
             
             # Fill if specified
             if shape.get('filled', False):
@@ -386,7 +693,8 @@ class PixelCanvas:
                 fill_pixels = Algorithms.scanline_fill(points, bbox)
                 pixels.extend(fill_pixels)
         
-        self.put_pixels(pixels, color)
+        runs = shape['_cached_runs'] = self.pixel_runs(pixels)
+        self.put_runs(runs, color)
 
 
 # ============================================================================
@@ -401,6 +709,9 @@ class GraphicsEngine:
         self.root.title("Computer Graphics Lab System (计算机图形学实验大作业)")
         self.root.geometry("900x700")
         
+        # Shapes, drawing mode and other editor state
+        self.state = EngineState()
+        
         # Canvas dimensions
         self.canvas_width = 800
         self.canvas_height = 600
@@ -419,6 +730,10 @@ class GraphicsEngine:
         self.canvas.bind('<B1-Motion>', self.on_mouse_drag)
         self.canvas.bind('<ButtonRelease-1>', self.on_mouse_up)
         
+        # Bind right-click for polygon completion
+        self.canvas.bind('<Button-2>', self.complete_polygon)  # macOS: Button-2
+        self.canvas.bind('<Button-3>', self.complete_polygon)  # Windows/Linux: Button-3
+        
         # Initial redraw
         self.redraw()
         self.update_status()
@@ -497,7 +812,6 @@ class GraphicsEngine:
     
     def update_status(self):
         """Update status bar text"""
-        global current_mode, current_color, temp_points
         mode_text = {
             'line': '画线模式',
             'circle': '画圆模式',
@@ -506,103 +820,102 @@ class GraphicsEngine:
             'polygon': '多边形模式 (右键完成)',
             'clip': '裁剪窗口选择模式'
         }
-        status = f"当前模式: {mode_text.get(current_mode, current_mode)} | 颜色: {current_color}"
-        if temp_points:
-            status += f" | 临时点: {len(temp_points)}"
+        state = self.state
+        status = f"当前模式: {mode_text.get(state.current_mode, state.current_mode)} | 颜色: {state.current_color}"
+        if state.temp_points:
+            status += f" | 临时点: {len(state.temp_points)}"
         self.status_var.set(status)
     
     def set_mode(self, mode):
         """Set drawing mode"""
-        global current_mode, temp_points
-        current_mode = mode
-        temp_points = []
+        self.state.current_mode = mode
+        self.state.temp_points = []
         self.update_status()
     
     def choose_color(self):
         """Choose drawing color"""
-        global current_color
         from tkinter import colorchooser
-        color = colorchooser.askcolor(current_color)
+        color = colorchooser.askcolor(self.state.current_color)
         if color[1]:
-            current_color = color[1]
+            self.state.current_color = color[1]
             self.update_status()
     
     def redraw(self):
         """Complete redraw of all shapes"""
-        global shapes
         self.pixel_canvas.clear()
         
         # Draw clip window if set
-        global clip_window
-        if clip_window:
-            x1, y1, x2, y2 = clip_window
+        if self.state.clip_window:
+            x1, y1, x2, y2 = self.state.clip_window
             # Draw rectangle outline in red
             rect_points = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
-            for i in range(4):
-                p0 = rect_points[i]
-                p1 = rect_points[(i + 1) % 4]
-                pixels = Algorithms.bresenham_line(int(p0[0]), int(p0[1]), int(p1[0]), int(p1[1]))
-                self.pixel_canvas.put_pixels(pixels, '#FF0000')
+            pixels = Algorithms.polyline(rect_points, closed=True)
+            self.pixel_canvas.put_pixels(pixels, '#FF0000')
         
         # Render all shapes
-        for shape in shapes:
+        for shape in self.state.shapes:
             self.pixel_canvas.render_shape(shape)
+        self.pixel_canvas.flush()
+    
+    def add_shape(self, shape):
+        """Add a new shape and draw it on top of the current image"""
+        self.state.shapes.append(shape)
+        # A new shape is painted last in a full redraw as well, so the
+        # existing pixels stay valid and only the new shape needs rendering
+        self.pixel_canvas.render_shape(shape)
+        self.pixel_canvas.flush()
     
     def on_mouse_down(self, event):
         """Handle mouse button press"""
-        global current_mode, temp_points, shapes, current_color
+        state = self.state
         
         x, y = event.x, event.y
         
-        if current_mode == 'line':
-            temp_points.append((x, y))
-            if len(temp_points) == 2:
-                shapes.append({
+        if state.current_mode == 'line':
+            state.temp_points.append((x, y))
+            if len(state.temp_points) == 2:
+                self.add_shape({
                     'type': 'line',
-                    'points': temp_points.copy(),
-                    'color': current_color
+                    'points': state.temp_points.copy(),
+                    'color': state.current_color
                 })
-                temp_points = []
-                self.redraw()
+                state.temp_points = []
         
-        elif current_mode == 'circle':
-            temp_points.append((x, y))
-            if len(temp_points) == 2:
-                shapes.append({
+        elif state.current_mode == 'circle':
+            state.temp_points.append((x, y))
+            if len(state.temp_points) == 2:
+                self.add_shape({
                     'type': 'circle',
-                    'points': temp_points.copy(),
-                    'color': current_color
+                    'points': state.temp_points.copy(),
+                    'color': state.current_color
                 })
-                temp_points = []
-                self.redraw()
+                state.temp_points = []
         
-        elif current_mode == 'bezier':
-            temp_points.append((x, y))
-            if len(temp_points) == 4:
-                shapes.append({
+        elif state.current_mode == 'bezier':
+            state.temp_points.append((x, y))
+            if len(state.temp_points) == 4:
+                self.add_shape({
                     'type': 'bezier',
-                    'points': temp_points.copy(),
-                    'color': current_color
+                    'points': state.temp_points.copy(),
+                    'color': state.current_color
                 })
-                temp_points = []
-                self.redraw()
+                state.temp_points = []
         
-        elif current_mode == 'char':
+        elif state.current_mode == 'char':
             char = simpledialog.askstring("字符", "输入一个字符 (A/B/C):", initialvalue='A')
             if char:
-                shapes.append({
+                self.add_shape({
                     'type': 'char',
                     'points': [(x, y)],
                     'char': char[0].upper(),
                     'scale': 2,
-                    'color': current_color
+                    'color': state.current_color
                 })
-                self.redraw()
         
-        elif current_mode == 'polygon':
-            temp_points.append((x, y))
+        elif state.current_mode == 'polygon':
+            state.temp_points.append((x, y))
         
-        elif current_mode == 'clip':
+        elif state.current_mode == 'clip':
             self.drag_start = (x, y)
             self.dragging = True
         
@@ -614,18 +927,29 @@ class GraphicsEngine:
     
     def on_mouse_up(self, event):
         """Handle mouse button release"""
-        global current_mode, clip_window
-        
-        if current_mode == 'clip' and self.dragging:
+        if self.state.current_mode == 'clip' and self.dragging:
             x, y = event.x, event.y
             x1, y1 = self.drag_start
-            clip_window = (min(x1, x), min(y1, y), max(x1, x), max(y1, y))
+            self.state.clip_window = (min(x1, x), min(y1, y), max(x1, x), max(y1, y))
             self.dragging = False
             self.redraw()
     
+    def complete_polygon(self, event):
+        """Complete polygon on right-click"""
+        state = self.state
+        
+        if state.current_mode == 'polygon' and len(state.temp_points) >= 3:
+            self.add_shape({
+                'type': 'polygon',
+                'points': state.temp_points.copy(),
+                'color': state.current_color,
+                'filled': False
+            })
+            state.temp_points = []
+            self.update_status()
+    
     def save_project(self):
         """Save shapes to JSON file"""
-        global shapes
         filename = filedialog.asksaveasfilename(
             defaultextension=".json",
             filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
@@ -633,21 +957,30 @@ class GraphicsEngine:
         if filename:
             try:
                 with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(shapes, f, indent=2, ensure_ascii=False)
+                    write_shapes(f, self.state.shapes)
                 messagebox.showinfo("成功", f"已保存到: {filename}")
             except Exception as e:
                 messagebox.showerror("错误", f"保存失败: {e}")
     
     def load_project(self):
         """Load shapes from JSON file"""
-        global shapes
         filename = filedialog.askopenfilename(
             filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
         )
         if filename:
             try:
+                shapes = []
                 with open(filename, 'r', encoding='utf-8') as f:
-                    shapes = json.load(f)
+                    for shape in read_shapes(f):
+                        # Runtime caches (underscore keys) are never trusted
+                        # from a file; write_shapes leaves them out as well
+                        shape = {k: v for k, v in shape.items() if not k.startswith('_')}
+                        # JSON gives [x, y] lists; store points as compact (x, y)
+                        # tuples like shapes drawn in this session
+                        if 'points' in shape:
+                            shape['points'] = [tuple(p) for p in shape['points']]
+                        shapes.append(shape)
+                self.state.shapes = shapes
                 self.redraw()
                 messagebox.showinfo("成功", f"已加载: {filename}")
             except Exception as e:
@@ -655,17 +988,15 @@ class GraphicsEngine:
     
     def clear_all(self):
         """Clear all shapes"""
-        global shapes, temp_points, clip_window
         if messagebox.askyesno("确认", "确定要清空所有图形吗？"):
-            shapes = []
-            temp_points = []
-            clip_window = None
+            self.state.shapes = []
+            self.state.temp_points = []
+            self.state.clip_window = None
             self.redraw()
     
     def transform_translate(self):
         """Apply translation to all shapes"""
-        global shapes
-        if not shapes:
+        if not self.state.shapes:
             messagebox.showwarning("警告", "没有图形可以变换")
             return
         
@@ -673,14 +1004,13 @@ class GraphicsEngine:
         dy = simpledialog.askinteger("平移", "Y方向偏移量:", initialvalue=50)
         
         if dx is not None and dy is not None:
-            for shape in shapes:
+            for shape in self.state.shapes:
                 translate_shape(shape, dx, dy)
             self.redraw()
     
     def transform_rotate(self):
         """Apply rotation to all shapes"""
-        global shapes
-        if not shapes:
+        if not self.state.shapes:
             messagebox.showwarning("警告", "没有图形可以变换")
             return
         
@@ -688,14 +1018,13 @@ class GraphicsEngine:
         if angle is not None:
             cx = self.canvas_width // 2
             cy = self.canvas_height // 2
-            for shape in shapes:
+            for shape in self.state.shapes:
                 rotate_shape(shape, angle, cx, cy)
             self.redraw()
     
     def transform_scale(self):
         """Apply scaling to all shapes"""
-        global shapes
-        if not shapes:
+        if not self.state.shapes:
             messagebox.showwarning("警告", "没有图形可以变换")
             return
         
@@ -703,35 +1032,43 @@ class GraphicsEngine:
         if factor is not None and factor > 0:
             cx = self.canvas_width // 2
             cy = self.canvas_height // 2
-            for shape in shapes:
+            for shape in self.state.shapes:
                 scale_shape(shape, factor, cx, cy)
             self.redraw()
     
     def fill_polygon(self):
         """Toggle fill for last polygon"""
-        global shapes
         # Find last polygon
-        for shape in reversed(shapes):
+        for shape in reversed(self.state.shapes):
             if shape['type'] == 'polygon':
                 shape['filled'] = not shape.get('filled', False)
+                shape.pop('_cached_runs', None)
                 self.redraw()
                 return
         messagebox.showwarning("警告", "没有找到多边形")
     
     def apply_clipping(self):
         """Apply Cohen-Sutherland clipping to all lines"""
-        global shapes, clip_window
-        
-        if not clip_window:
+        if not self.state.clip_window:
             messagebox.showwarning("警告", "请先设置裁剪窗口")
             return
         
-        new_shapes = []
-        for shape in shapes:
-            if shape['type'] == 'line' and len(shape['points']) >= 2:
+        # Clip all lines in one batch, then rebuild the shape list in order
+        def is_line(shape):
+            return shape['type'] == 'line' and len(shape['points']) >= 2
+        
+        segments = []
+        for shape in self.state.shapes:
+            if is_line(shape):
                 x0, y0 = map(int, shape['points'][0])
                 x1, y1 = map(int, shape['points'][1])
-                result = Algorithms.cohen_sutherland_clip(x0, y0, x1, y1, clip_window)
+                segments.append((x0, y0, x1, y1))
+        results = iter(Algorithms.cohen_sutherland_clip_batch(segments, self.state.clip_window))
+        
+        new_shapes = []
+        for shape in self.state.shapes:
+            if is_line(shape):
+                result = next(results)
                 if result:
                     new_shapes.append({
                         'type': 'line',
@@ -741,7 +1078,7 @@ class GraphicsEngine:
             else:
                 new_shapes.append(shape)
         
-        shapes = new_shapes
+        self.state.shapes = new_shapes
         self.redraw()
         messagebox.showinfo("完成", "裁剪已应用")
     
@@ -765,26 +1102,6 @@ class GraphicsEngine:
         )
 
 
-# ============================================================================
-# POLYGON COMPLETION (Right-click handler)
-# ============================================================================
-
-def complete_polygon(event):
-    """Complete polygon on right-click"""
-    global temp_points, shapes, current_mode, current_color
-    
-    if current_mode == 'polygon' and len(temp_points) >= 3:
-        shapes.append({
-            'type': 'polygon',
-            'points': temp_points.copy(),
-            'color': current_color,
-            'filled': False
-        })
-        temp_points = []
-        app.redraw()
-        app.update_status()
-
-
 # ============================================================================
 # MAIN ENTRY POINT
 # ============================================================================
@@ -793,8 +1110,4 @@ if __name__ == '__main__':
     root = tk.Tk()
     app = GraphicsEngine(root)
     
-    # Bind right-click for polygon completion
-    app.canvas.bind('<Button-2>', complete_polygon)  # macOS: Button-2
-    app.canvas.bind('<Button-3>', complete_polygon)  # Windows/Linux: Button-3
-    
     root.mainloop()